@@ -2,8 +2,11 @@
 Chat Endpoints - Streaming SSE for real-time AI responses
 With automatic [GEN_IMG] detection and image generation
 """
-import json
+import asyncio
 import re
+from contextlib import aclosing
+from typing import AsyncIterator
+import orjson
 from fastapi import APIRouter, Depends
 from fastapi.responses import StreamingResponse
 from app.schemas.chat import ChatRequest
@@ -12,24 +15,148 @@ from app.services.image_service import get_image_service
 
 router = APIRouter()
 
+# Constant terminal SSE frame, serialized once
+DONE_FRAME = b'data: {"content":"","done":true}\n\n'
+
+# Coalesce small LLM deltas into one frame until either limit is hit
+STREAM_FLUSH_CHARS = 4096
+STREAM_FLUSH_INTERVAL = 0.05  # seconds
+
+# [GEN_IMG] tag followed by the image prompt, up to the first period.
+# SYSTEM_PROMPT emits the tag verbatim, so it is matched case-sensitively.
+GEN_IMG_TAG = "[GEN_IMG]"
+_GEN_IMG_RE = re.compile(r'\[GEN_IMG\]\s*(.+?)(?:\.|$)', re.DOTALL)
+# Same prompt, but only once its closing period has streamed in
+_GEN_IMG_COMPLETE_RE = re.compile(r'\[GEN_IMG\]\s*(.+?)\.', re.DOTALL)
+
+
+def sse_frame(payload: dict) -> bytes:
+    """Encode a payload as a single SSE `data:` frame"""
+    return b"data: " + orjson.dumps(payload) + b"\n\n"
+
+
+async def batch_chunks(chunks: AsyncIterator[str]) -> AsyncIterator[str]:
+    """
+    Coalesce small stream deltas into batches, emitted once STREAM_FLUSH_CHARS
+    are buffered or STREAM_FLUSH_INTERVAL has passed. The interval runs on a
+    timer, so buffered tokens still go out while the model pauses.
+    """
+    loop = asyncio.get_running_loop()
+    iterator = aiter(chunks)
+    pending: list[str] = []
+    pending_size = 0
+    last_flush = loop.time() - STREAM_FLUSH_INTERVAL  # first token goes out immediately
+    next_chunk: asyncio.Future | None = None
+    
+    try:
+        while True:
+            if next_chunk is None:
+                next_chunk = asyncio.ensure_future(anext(iterator))
+            
+            # Only wait out the rest of the interval while something is buffered.
+            # asyncio.wait leaves the read running on timeout, unlike wait_for
+            timeout = max(0.0, last_flush + STREAM_FLUSH_INTERVAL - loop.time()) if pending else None
+            done, _ = await asyncio.wait((next_chunk,), timeout=timeout)
+            
+            if done:
+                task, next_chunk = next_chunk, None
+                try:
+                    chunk = task.result()
+                except StopAsyncIteration:
+                    break
+                except Exception:
+                    # Deliver what already streamed before the error surfaces
+                    if pending:
+                        yield "".join(pending)
+                    raise
+                pending.append(chunk)
+                pending_size += len(chunk)
+                if pending_size < STREAM_FLUSH_CHARS and loop.time() - last_flush < STREAM_FLUSH_INTERVAL:
+                    continue
+            
+            yield "".join(pending)
+            pending.clear()
+            pending_size = 0
+            last_flush = loop.time()
+        
+        if pending:
+            yield "".join(pending)
+    finally:
+        if next_chunk is not None:
+            next_chunk.cancel()
+
 
 def parse_gen_img(response: str) -> tuple[str, str | None]:
     """
     Parse [GEN_IMG] from response and extract image prompt.
     Returns (cleaned_text, image_prompt_or_none)
     """
-    pattern = r'\[GEN_IMG\]\s*(.+?)(?:\.|$)'
-    match = re.search(pattern, response, re.IGNORECASE | re.DOTALL)
+    # Fast path: most responses carry no tag, skip the regex entirely
+    if GEN_IMG_TAG not in response:
+        return response, None
+    
+    match = _GEN_IMG_RE.search(response)
     
     if match:
         image_prompt = match.group(1).strip()
-        # Remove the [GEN_IMG] tag from text
-        cleaned_text = re.sub(r'\[GEN_IMG\]\s*.+?(?:\.|$)', '', response, flags=re.IGNORECASE | re.DOTALL).strip()
+        # Remove the [GEN_IMG] tag from text by slicing around the match
+        cleaned_text = (response[:match.start()] + response[match.end():]).strip()
         return cleaned_text, image_prompt
     
     return response, None
 
 
+class ImagePrefetcher:
+    """
+    Watches streamed text for a complete [GEN_IMG] prompt and starts image
+    generation right away, overlapping it with the rest of the LLM stream.
+    """
+    
+    def __init__(self):
+        self._tail = ""  # last few chars, in case the tag spans chunks
+        self._tagged: str | None = None  # text from the tag onward
+        self._prompt: str | None = None
+        self._task: asyncio.Task | None = None
+    
+    def feed(self, chunk: str) -> None:
+        """Scan a streamed chunk; launches generation once the prompt is complete"""
+        if self._prompt is not None:
+            return
+        
+        if self._tagged is None:
+            window = self._tail + chunk
+            index = window.find(GEN_IMG_TAG)
+            if index == -1:
+                self._tail = window[-(len(GEN_IMG_TAG) - 1):]
+                return
+            self._tagged = window[index:]
+        else:
+            self._tagged += chunk
+        
+        match = _GEN_IMG_COMPLETE_RE.match(self._tagged)
+        if match:
+            self._prompt = match.group(1).strip()
+            if self._prompt:
+                self._task = asyncio.create_task(get_image_service().generate_image(self._prompt))
+    
+    async def get_image(self, image_prompt: str) -> str:
+        """Image for the final parsed prompt, reusing the prefetch when it matches"""
+        if self._task is not None and self._prompt == image_prompt:
+            return await self._task
+        self.cancel()
+        return await get_image_service().generate_image(image_prompt)
+    
+    def cancel(self) -> None:
+        """Stop a prefetch that is no longer needed"""
+        if self._task is None:
+            return
+        if not self._task.done():
+            self._task.cancel()
+        elif not self._task.cancelled():
+            # Mark a failed prefetch's error as retrieved; nobody awaited it
+            self._task.exception()
+
+
 @router.post("/stream")
 async def stream_chat(
     request: ChatRequest,
@@ -46,42 +173,45 @@ async def stream_chat(
     - Final: `data: {"content": "", "done": true}`
     """
     async def generate():
+        prefetcher = ImagePrefetcher()
         try:
-            messages = [msg.model_dump() for msg in request.messages]
-            full_response = ""
+            parts: list[str] = []
             
-            # Stream the text response
-            async for chunk in ai_service.stream_completion(
-                messages=messages,
+            # Stream the text response, batching tiny deltas into fewer frames
+            async with aclosing(batch_chunks(ai_service.stream_completion(
+                messages=request.messages,
                 model=request.model
-            ):
-                full_response += chunk
-                data = json.dumps({"content": chunk, "done": False})
-                yield f"data: {data}\n\n"
+            ))) as batches:
+                async for batch in batches:
+                    parts.append(batch)
+                    prefetcher.feed(batch)
+                    yield sse_frame({"content": batch, "done": False})
             
             # Check for [GEN_IMG] in the response
+            full_response = "".join(parts)
             cleaned_text, image_prompt = parse_gen_img(full_response)
             
             if image_prompt:
                 # Notify client we're generating image
-                yield f"data: {json.dumps({'content': ' 🎨 generating...', 'done': False})}\n\n"
+                yield sse_frame({"content": " 🎨 generating...", "done": False})
                 
                 try:
-                    image_service = get_image_service()
-                    base64_image = await image_service.generate_image(image_prompt)
+                    # Usually already in flight since the prompt streamed in
+                    base64_image = await prefetcher.get_image(image_prompt)
                     
                     # Send image data in final message
-                    yield f"data: {json.dumps({'content': '', 'done': True, 'image': base64_image, 'imagePrompt': image_prompt})}\n\n"
+                    yield sse_frame({"content": "", "done": True, "image": base64_image, "imagePrompt": image_prompt})
                 except Exception as img_error:
-                    yield f"data: {json.dumps({'content': f' (image gen failed: {str(img_error)})', 'done': False})}\n\n"
-                    yield f"data: {json.dumps({'content': '', 'done': True})}\n\n"
+                    yield sse_frame({"content": f" (image gen failed: {str(img_error)})", "done": False})
+                    yield DONE_FRAME
             else:
                 # No image, just signal completion
-                yield f"data: {json.dumps({'content': '', 'done': True})}\n\n"
+                yield DONE_FRAME
             
         except Exception as e:
-            error_data = json.dumps({"error": str(e), "done": True})
-            yield f"data: {error_data}\n\n"
+            yield sse_frame({"error": str(e), "done": True})
+        finally:
+            prefetcher.cancel()
     
     return StreamingResponse(
         generate(),
@@ -103,33 +233,35 @@ async def chat(
     """
     Non-streaming chat completion with auto image generation.
     """
-    messages = [msg.model_dump() for msg in request.messages]
-    
-    full_response = ""
-    async for chunk in ai_service.stream_completion(
-        messages=messages,
-        model=request.model
-    ):
-        full_response += chunk
-    
-    # Parse for image generation
-    cleaned_text, image_prompt = parse_gen_img(full_response)
-    
-    result = {
-        "message": {
-            "role": "assistant",
-            "content": cleaned_text
-        },
-        "conversation_id": request.conversation_id
-    }
-    
-    if image_prompt:
-        try:
-            image_service = get_image_service()
-            result["image"] = await image_service.generate_image(image_prompt)
-            result["imagePrompt"] = image_prompt
-        except Exception:
-            pass  # Image gen failed, just return text
-    
-    return result
-
+    prefetcher = ImagePrefetcher()
+    try:
+        parts: list[str] = []
+        async for chunk in ai_service.stream_completion(
+            messages=request.messages,
+            model=request.model
+        ):
+            parts.append(chunk)
+            prefetcher.feed(chunk)
+        full_response = "".join(parts)
+        
+        # Parse for image generation
+        cleaned_text, image_prompt = parse_gen_img(full_response)
+        
+        result = {
+            "message": {
+                "role": "assistant",
+                "content": cleaned_text
+            },
+            "conversation_id": request.conversation_id
+        }
+        
+        if image_prompt:
+            try:
+                result["image"] = await prefetcher.get_image(image_prompt)
+                result["imagePrompt"] = image_prompt
+            except Exception:
+                pass  # Image gen failed, just return text
+        
+        return result
+    finally:
+        prefetcher.cancel()
@@ -1,13 +1,21 @@
 """
 Conversations API - CRUD for chat history
 """
+import asyncio
+import base64
+import binascii
+import hashlib
+import os
+import orjson
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import Response
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, desc
+from sqlalchemy import select, desc, update, delete
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import selectinload
 from pydantic import BaseModel
 from typing import Optional
-from app.database import get_db
+from app.database import get_db, IMAGES_DIR
 from app.models import Conversation, ChatMessage
 
 router = APIRouter(tags=["conversations"])
@@ -28,16 +36,77 @@ class ConversationUpdate(BaseModel):
     title: str
 
 
+def orjson_response(content) -> Response:
+    """
+    Serialize plain dicts/lists straight to JSON bytes.
+    Skips jsonable_encoder; orjson handles datetimes natively.
+    """
+    return Response(orjson.dumps(content), media_type="application/json")
+
+
+# Magic bytes -> file extension, so StaticFiles serves the right content type
+IMAGE_SIGNATURES = (
+    (b"\xff\xd8\xff", ".jpg"),
+    (b"\x89PNG\r\n\x1a\n", ".png"),
+    (b"GIF8", ".gif"),
+)
+
+
+def image_extension(image_bytes: bytes) -> str:
+    """Pick a file extension from the image's magic bytes"""
+    for signature, ext in IMAGE_SIGNATURES:
+        if image_bytes.startswith(signature):
+            return ext
+    if image_bytes[:4] == b"RIFF" and image_bytes[8:12] == b"WEBP":
+        return ".webp"
+    return ".bin"
+
+
+def decode_image(image_b64: str) -> tuple[str, bytes]:
+    """
+    Decode a base64 image and derive its file name.
+    Files are named by content hash, so identical images are stored once.
+    """
+    image_bytes = base64.b64decode(image_b64, validate=True)
+    filename = f"{hashlib.sha256(image_bytes).hexdigest()}{image_extension(image_bytes)}"
+    return filename, image_bytes
+
+
+def save_image(filename: str, image_bytes: bytes) -> None:
+    """Write an image under IMAGES_DIR unless an identical one is already there"""
+    path = os.path.join(IMAGES_DIR, filename)
+    
+    if not os.path.exists(path):
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(image_bytes)
+        os.replace(tmp_path, path)
+
+
+def remove_images(filenames: list[str]) -> None:
+    """Delete image files under IMAGES_DIR, ignoring ones already gone"""
+    for filename in filenames:
+        try:
+            os.remove(os.path.join(IMAGES_DIR, filename))
+        except FileNotFoundError:
+            pass
+
+
 # Endpoints
 
 @router.get("")
 async def list_conversations(db: AsyncSession = Depends(get_db)):
     """List all conversations, most recent first"""
+    # Select plain columns so rows skip ORM object construction entirely
     result = await db.execute(
-        select(Conversation).order_by(desc(Conversation.updated_at))
+        select(
+            Conversation.id,
+            Conversation.title,
+            Conversation.created_at,
+            Conversation.updated_at,
+        ).order_by(desc(Conversation.updated_at))
     )
-    conversations = result.scalars().all()
-    return [conv.to_dict() for conv in conversations]
+    return orjson_response([row._asdict() for row in result.all()])
 
 
 @router.post("")
@@ -67,10 +136,10 @@ async def get_conversation(conversation_id: int, db: AsyncSession = Depends(get_
     if not conversation:
         raise HTTPException(status_code=404, detail="Conversation not found")
     
-    return {
+    return orjson_response({
         **conversation.to_dict(),
-        "messages": [msg.to_dict() for msg in sorted(conversation.messages, key=lambda m: m.created_at)]
-    }
+        "messages": [msg.to_dict() for msg in conversation.messages]
+    })
 
 
 @router.patch("/{conversation_id}")
@@ -81,31 +150,53 @@ async def update_conversation(
 ):
     """Update conversation title"""
     result = await db.execute(
-        select(Conversation).where(Conversation.id == conversation_id)
+        update(Conversation)
+        .where(Conversation.id == conversation_id)
+        .values(title=data.title)
+        .returning(Conversation)
     )
     conversation = result.scalar_one_or_none()
     
     if not conversation:
         raise HTTPException(status_code=404, detail="Conversation not found")
     
-    conversation.title = data.title
     await db.commit()
-    await db.refresh(conversation)
     return conversation.to_dict()
 
 
 @router.delete("/{conversation_id}")
 async def delete_conversation(conversation_id: int, db: AsyncSession = Depends(get_db)):
     """Delete a conversation and all its messages"""
+    # Delete the messages first, rather than leaving them to ON DELETE
+    # CASCADE, to learn which image files they pointed at
     result = await db.execute(
-        select(Conversation).where(Conversation.id == conversation_id)
+        delete(ChatMessage)
+        .where(ChatMessage.conversation_id == conversation_id)
+        .returning(ChatMessage.image_path)
     )
-    conversation = result.scalar_one_or_none()
+    image_paths = {path for path in result.scalars() if path}
     
-    if not conversation:
+    result = await db.execute(
+        delete(Conversation)
+        .where(Conversation.id == conversation_id)
+        .returning(Conversation.id)
+    )
+    
+    if result.scalar_one_or_none() is None:
         raise HTTPException(status_code=404, detail="Conversation not found")
     
-    await db.delete(conversation)
+    if image_paths:
+        # Files are shared by content hash; keep any that another message still uses
+        result = await db.execute(
+            select(ChatMessage.image_path)
+            .where(ChatMessage.image_path.in_(image_paths))
+            .distinct()
+        )
+        unused = list(image_paths - set(result.scalars()))
+        # Remove before commit: the open write transaction keeps a concurrent
+        # add_message from claiming one of these files in between
+        await asyncio.to_thread(remove_images, unused)
+    
     await db.commit()
     return {"success": True}
 
@@ -117,29 +208,43 @@ async def add_message(
     db: AsyncSession = Depends(get_db)
 ):
     """Add a message to a conversation"""
-    # Check conversation exists
-    result = await db.execute(
-        select(Conversation).where(Conversation.id == conversation_id)
-    )
-    conversation = result.scalar_one_or_none()
-    
-    if not conversation:
-        raise HTTPException(status_code=404, detail="Conversation not found")
+    # Store image bytes on disk rather than as base64 in the database
+    image_path = image_bytes = None
+    if data.image:
+        try:
+            image_path, image_bytes = await asyncio.to_thread(decode_image, data.image)
+        except binascii.Error:
+            raise HTTPException(status_code=400, detail="Invalid base64 image data")
     
-    # Create message
+    # Create message; a missing conversation surfaces as a foreign key violation
     message = ChatMessage(
         conversation_id=conversation_id,
         role=data.role,
         content=data.content,
-        image=data.image
+        image_path=image_path
     )
     db.add(message)
     
+    try:
+        await db.flush()
+    except IntegrityError:
+        await db.rollback()
+        raise HTTPException(status_code=404, detail="Conversation not found")
+    
+    # Only write the file once the row is known to insert, so a missing
+    # conversation doesn't leave an orphan behind
+    if image_bytes is not None:
+        await asyncio.to_thread(save_image, image_path, image_bytes)
+    
     # Update conversation title if first user message
-    if data.role == "user" and conversation.title == "New Chat":
+    if data.role == "user":
         # Use first 50 chars of message as title
-        conversation.title = data.content[:50] + ("..." if len(data.content) > 50 else "")
+        title = data.content[:50] + ("..." if len(data.content) > 50 else "")
+        await db.execute(
+            update(Conversation)
+            .where(Conversation.id == conversation_id, Conversation.title == "New Chat")
+            .values(title=title)
+        )
     
     await db.commit()
-    await db.refresh(message)
     return message.to_dict()
@@ -1,12 +1,19 @@
 """
 Voice API Endpoints - Speech-to-Text transcription
 """
+import hashlib
 from fastapi import APIRouter, UploadFile, File, HTTPException
 
-from app.services.voice_service import get_voice_service
+from app.services.voice_service import get_voice_service, TranscriptionError
 
 router = APIRouter()
 
+# Groq Whisper upload limit
+MAX_AUDIO_BYTES = 25 * 1024 * 1024
+UPLOAD_CHUNK_SIZE = 256 * 1024
+# Clips at or below this size are sent as bytes; larger ones stream from the spooled upload
+STREAM_UPLOAD_MIN_BYTES = 256 * 1024
+
 
 @router.post("/transcribe")
 async def transcribe_audio(
@@ -32,24 +39,44 @@ async def transcribe_audio(
             detail=f"Unsupported audio format: {file.content_type}. Use webm, mp3, wav, or m4a."
         )
     
-    # Read audio bytes
-    audio_bytes = await file.read()
+    # Voice input is optional; without a Groq key the endpoint is unavailable
+    try:
+        voice_service = get_voice_service()
+    except RuntimeError as e:
+        raise HTTPException(status_code=503, detail=str(e))
     
-    if len(audio_bytes) == 0:
+    # Walk the upload once to enforce the size limit and hash it for the
+    # transcript cache, without holding the whole clip in memory
+    hasher = hashlib.sha256()
+    size = 0
+    while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+        size += len(chunk)
+        if size > MAX_AUDIO_BYTES:
+            raise HTTPException(status_code=413, detail="Audio file too large. Max 25MB.")
+        hasher.update(chunk)
+    
+    if size == 0:
         raise HTTPException(status_code=400, detail="Empty audio file")
     
-    # Check file size (25MB limit for Groq)
-    if len(audio_bytes) > 25 * 1024 * 1024:
-        raise HTTPException(status_code=400, detail="Audio file too large. Max 25MB.")
+    await file.seek(0)
+    if size <= STREAM_UPLOAD_MIN_BYTES:
+        audio = await file.read()
+    else:
+        # Starlette has already spooled the upload; hand the file over so the
+        # multipart body is read from it chunk by chunk
+        audio = file.file
     
     try:
-        voice_service = get_voice_service()
         transcribed_text = await voice_service.transcribe_audio(
-            audio_bytes=audio_bytes,
-            filename=file.filename or "audio.webm"
+            audio=audio,
+            filename=file.filename or "audio.webm",
+            digest=hasher.digest(),
         )
         
         return {"text": transcribed_text}
         
+    except TranscriptionError as e:
+        # Upstream failure rather than a bug in this service
+        raise HTTPException(status_code=502, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -29,6 +29,10 @@ class Settings(BaseSettings):
     groq_api_key: str = ""  # Groq API (fast inference)
     huggingface_api_key: str = ""  # Hugging Face API (image generation)
     
+    # Voice: clips below either threshold are treated as silence (0 disables)
+    voice_min_audio_bytes: int = 2048
+    voice_min_duration_ms: int = 300
+    
     # Default AI Model
     default_model: str = "llama-3.3-70b-versatile"
     
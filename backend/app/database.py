@@ -1,18 +1,22 @@
 """
 Database Setup - SQLAlchemy with SQLite
 """
-from sqlalchemy import create_engine
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
-from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy import event, inspect, text
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+from sqlalchemy.orm import declarative_base
 import os
 
 # Create data directory if it doesn't exist
 DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data")
 os.makedirs(DATA_DIR, exist_ok=True)
 
+# Message images live on disk, named by the SHA-256 of their bytes
+IMAGES_DIR = os.path.join(DATA_DIR, "images")
+IMAGES_URL_PATH = "/api/v1/images"
+os.makedirs(IMAGES_DIR, exist_ok=True)
+
 # Database URL
 DATABASE_URL = f"sqlite+aiosqlite:///{os.path.join(DATA_DIR, 'chats.db')}"
-SYNC_DATABASE_URL = f"sqlite:///{os.path.join(DATA_DIR, 'chats.db')}"
 
 # Async engine for FastAPI
 async_engine = create_async_engine(
@@ -21,17 +25,31 @@ async_engine = create_async_engine(
     future=True
 )
 
-# Sync engine for table creation
-sync_engine = create_engine(
-    SYNC_DATABASE_URL,
-    echo=False,
-    future=True
+# SQLite tuning applied to every new connection: WAL lets readers run
+# alongside a writer, and NORMAL sync is durable enough under WAL
+SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA mmap_size=268435456",  # 256MB
+    "PRAGMA cache_size=-65536",  # 64MB
+    "PRAGMA busy_timeout=5000",
+    "PRAGMA foreign_keys=ON",  # enforce FKs and ON DELETE CASCADE
 )
 
+
+@event.listens_for(async_engine.sync_engine, "connect")
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    """Apply SQLITE_PRAGMAS to a freshly opened connection"""
+    cursor = dbapi_connection.cursor()
+    for pragma in SQLITE_PRAGMAS:
+        cursor.execute(pragma)
+    cursor.close()
+
+
 # Session factory
-AsyncSessionLocal = sessionmaker(
+AsyncSessionLocal = async_sessionmaker(
     async_engine,
-    class_=AsyncSession,
     expire_on_commit=False
 )
 
@@ -48,7 +66,25 @@ async def get_db() -> AsyncSession:
             await session.close()
 
 
-def init_db():
+def _create_schema(conn):
+    """Create tables, then add any columns and indexes introduced later"""
+    Base.metadata.create_all(bind=conn)
+    
+    # create_all skips existing tables, so patch those up in place
+    columns = {c["name"] for c in inspect(conn).get_columns("chat_messages")}
+    if "image_path" not in columns:
+        conn.execute(text("ALTER TABLE chat_messages ADD COLUMN image_path VARCHAR(512)"))
+    
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=conn, checkfirst=True)
+    
+    # Superseded by ix_messages_conv_created, which leads with conversation_id
+    conn.execute(text("DROP INDEX IF EXISTS ix_chat_messages_conversation_id"))
+
+
+async def init_db():
     """Initialize database tables"""
     from app import models  # Import models to register them
-    Base.metadata.create_all(bind=sync_engine)
+    async with async_engine.begin() as conn:
+        await conn.run_sync(_create_schema)
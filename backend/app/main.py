@@ -1,14 +1,29 @@
 """
 Zeno AI Backend - FastAPI Application
 """
+from contextlib import asynccontextmanager
+from brotli_asgi import BrotliMiddleware
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.staticfiles import StaticFiles
 from app.api.v1.router import api_router
 from app.config import settings
-from app.database import init_db
+from app.database import async_engine, init_db, IMAGES_DIR, IMAGES_URL_PATH
+from app.services.ai_service import close_ai_service
+from app.services.image_service import close_image_service
+from app.services.voice_service import close_voice_service
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """App lifespan - create database tables on startup, release pools on shutdown"""
+    await init_db()
+    yield
+    await close_ai_service()
+    await close_image_service()
+    await close_voice_service()
+    await async_engine.dispose()
 
-# Initialize database tables on startup
-init_db()
 
 app = FastAPI(
     title="Zeno API",
@@ -16,6 +31,7 @@ app = FastAPI(
     version="1.0.0",
     docs_url="/docs",
     redoc_url="/redoc",
+    lifespan=lifespan,
 )
 
 # CORS Configuration
@@ -27,12 +43,29 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Response compression (brotli, gzip fallback). brotli-asgi only excludes by
+# path: keep SSE uncompressed for real-time delivery, and skip stored PNGs
+app.add_middleware(
+    BrotliMiddleware,
+    quality=4,
+    minimum_size=1024,
+    excluded_handlers=[r"/chat/stream$", f"^{IMAGES_URL_PATH}/"],
+)
+
 
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
-    return {"status": "healthy", "version": "1.0.0"}
+    return {
+        "status": "healthy",
+        "version": "1.0.0",
+        # Voice transcription needs a Groq key; report it so a missing key shows up at deploy time
+        "voice": bool(settings.groq_api_key),
+    }
 
 
 # Include API routes
 app.include_router(api_router, prefix="/api/v1")
+
+# Serve stored message images
+app.mount(IMAGES_URL_PATH, StaticFiles(directory=IMAGES_DIR), name="images")
@@ -2,9 +2,22 @@
 Database Models - Conversation and Message
 """
 from datetime import datetime
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Index
 from sqlalchemy.orm import relationship
-from app.database import Base
+from app.database import Base, IMAGES_URL_PATH
+
+
+def loaded_values(obj, names: tuple[str, ...]) -> dict:
+    """
+    Read column values from the instance __dict__, skipping the
+    instrumented attribute descriptors. Falls back to normal attribute
+    access if any of them is not loaded.
+    """
+    state = obj.__dict__
+    try:
+        return {name: state[name] for name in names}
+    except KeyError:
+        return {name: getattr(obj, name) for name in names}
 
 
 class Conversation(Base):
@@ -17,36 +30,39 @@ class Conversation(Base):
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # Relationship to messages
-    messages = relationship("ChatMessage", back_populates="conversation", cascade="all, delete-orphan")
+    messages = relationship(
+        "ChatMessage",
+        back_populates="conversation",
+        cascade="all, delete-orphan",
+        order_by="ChatMessage.created_at",
+    )
     
     def to_dict(self):
-        return {
-            "id": self.id,
-            "title": self.title,
-            "created_at": self.created_at.isoformat() if self.created_at else None,
-            "updated_at": self.updated_at.isoformat() if self.updated_at else None,
-        }
+        return loaded_values(self, ("id", "title", "created_at", "updated_at"))
 
 
 class ChatMessage(Base):
     """Individual chat message"""
     __tablename__ = "chat_messages"
+    __table_args__ = (
+        # Serves both conversation lookups and ordered history loads
+        Index("ix_messages_conv_created", "conversation_id", "created_at"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
-    conversation_id = Column(Integer, ForeignKey("conversations.id", ondelete="CASCADE"), index=True)
+    conversation_id = Column(Integer, ForeignKey("conversations.id", ondelete="CASCADE"))
     role = Column(String(20), nullable=False)  # 'user' or 'assistant'
     content = Column(Text, nullable=False)
-    image = Column(Text, nullable=True)  # Base64 image data
+    image = Column(Text, nullable=True)  # Legacy inline base64 image data
+    image_path = Column(String(512), nullable=True)  # Image file name under IMAGES_DIR
     created_at = Column(DateTime, default=datetime.utcnow)
     
     # Relationship to conversation
     conversation = relationship("Conversation", back_populates="messages")
     
     def to_dict(self):
-        return {
-            "id": self.id,
-            "role": self.role,
-            "content": self.content,
-            "image": self.image,
-            "created_at": self.created_at.isoformat() if self.created_at else None,
-        }
+        data = loaded_values(self, ("id", "role", "content", "image", "image_path", "created_at"))
+        # image stays base64 (legacy rows); files saved on disk come back as a URL path
+        image_path = data.pop("image_path")
+        data["image_url"] = f"{IMAGES_URL_PATH}/{image_path}" if image_path else None
+        return data
@@ -1,14 +1,34 @@
 """
 AI Service - OpenAI/Anthropic/Groq Integration with Streaming
 """
+from functools import lru_cache
 from typing import AsyncGenerator
 from openai import AsyncOpenAI
 from anthropic import AsyncAnthropic
 from app.config import settings
+from app.schemas.chat import MessageSchema
 
 # Professional AI Assistant system prompt
 SYSTEM_PROMPT = """You are a professional AI assistant. You communicate clearly, concisely, and helpfully with accurate, well-structured responses. When the user asks you to generate, create, make, or draw an image, respond with [GEN_IMG] followed by a detailed prompt for the image. For example, if they say 'draw a cat', respond: 'I would be happy to create that for you. [GEN_IMG] A cute fluffy cat with large expressive eyes sitting in a warm, cozy setting with soft lighting'. Maintain a friendly yet professional tone at all times."""
 
+# Prebuilt system message injected ahead of every Groq conversation
+SYSTEM_MESSAGE = {"role": "system", "content": SYSTEM_PROMPT}
+
+# Model families served by Groq. Matched anywhere in the name, so
+# namespaced and derived models (meta-llama/..., deepseek-r1-distill-llama-70b)
+# route to Groq too
+GROQ_MODEL_FAMILIES = ("llama", "mixtral", "gemma")
+
+
+@lru_cache(maxsize=256)
+def resolve_provider(model: str) -> str:
+    """Map a model identifier to its provider: 'groq', 'anthropic' or 'openai'"""
+    if any(family in model for family in GROQ_MODEL_FAMILIES):
+        return "groq"
+    if model.startswith("claude"):
+        return "anthropic"
+    return "openai"
+
 
 class AIService:
     """Service for AI model interactions with streaming support"""
@@ -31,54 +51,56 @@ class AIService:
                 api_key=settings.groq_api_key,
                 base_url="https://api.groq.com/openai/v1"  # Groq's API endpoint
             )
+        
+        # Provider name -> streaming implementation
+        self._streamers = {
+            "groq": self._stream_groq,
+            "anthropic": self._stream_anthropic,
+            "openai": self._stream_openai,
+        }
+    
+    async def aclose(self) -> None:
+        """Close the provider clients and their connection pools"""
+        for client in (self.openai_client, self.anthropic_client, self.groq_client):
+            if client is not None:
+                await client.close()
     
     async def stream_completion(
         self,
-        messages: list[dict],
+        messages: list[MessageSchema],
         model: str = "llama-3.3-70b-versatile"
     ) -> AsyncGenerator[str, None]:
         """
         Stream completion tokens from the AI model.
         
         Args:
-            messages: List of message dicts with 'role' and 'content'
+            messages: Validated chat messages with 'role' and 'content'
             model: Model identifier (llama-3.3-70b-versatile, mixtral-8x7b-32768, etc.)
         
         Yields:
             String tokens as they arrive from the API
         """
-        # Groq models
-        groq_models = ["llama", "mixtral", "gemma", "llama-3"]
-        is_groq = any(model.startswith(prefix) or prefix in model for prefix in groq_models)
-        
-        if is_groq:
-            async for token in self._stream_groq(messages, model):
-                yield token
-        elif model.startswith("claude"):
-            async for token in self._stream_anthropic(messages, model):
-                yield token
-        else:
-            async for token in self._stream_openai(messages, model):
-                yield token
+        stream = self._streamers[resolve_provider(model)]
+        async for token in stream(messages, model):
+            yield token
     
     async def _stream_groq(
         self,
-        messages: list[dict],
+        messages: list[MessageSchema],
         model: str
     ) -> AsyncGenerator[str, None]:
         """Stream from Groq API (fast inference)"""
         if not self.groq_client:
             raise ValueError("Groq API key not configured. Add GROQ_API_KEY to your .env file.")
         
-        # Inject system prompt at the beginning
-        groq_messages = [
-            {"role": "system", "content": SYSTEM_PROMPT}
-        ]
-        
-        # Add user messages (skip any existing system messages)
-        for msg in messages:
-            if msg["role"] != "system":
-                groq_messages.append({"role": msg["role"], "content": msg["content"]})
+        # Inject system prompt at the beginning, then user messages
+        # (skip any existing system messages)
+        groq_messages = [SYSTEM_MESSAGE]
+        groq_messages.extend(
+            {"role": msg.role, "content": msg.content}
+            for msg in messages
+            if msg.role != "system"
+        )
         
         stream = await self.groq_client.chat.completions.create(
             model=model,
@@ -92,7 +114,7 @@ class AIService:
     
     async def _stream_openai(
         self,
-        messages: list[dict],
+        messages: list[MessageSchema],
         model: str
     ) -> AsyncGenerator[str, None]:
         """Stream from OpenAI API"""
@@ -101,7 +123,7 @@ class AIService:
         
         # Convert messages to OpenAI format
         openai_messages = [
-            {"role": msg["role"], "content": msg["content"]}
+            {"role": msg.role, "content": msg.content}
             for msg in messages
         ]
         
@@ -117,7 +139,7 @@ class AIService:
     
     async def _stream_anthropic(
         self,
-        messages: list[dict],
+        messages: list[MessageSchema],
         model: str
     ) -> AsyncGenerator[str, None]:
         """Stream from Anthropic API"""
@@ -129,12 +151,12 @@ class AIService:
         conversation = []
         
         for msg in messages:
-            if msg["role"] == "system":
-                system_msg = msg["content"]
+            if msg.role == "system":
+                system_msg = msg.content
             else:
                 conversation.append({
-                    "role": msg["role"],
-                    "content": msg["content"]
+                    "role": msg.role,
+                    "content": msg.content
                 })
         
         async with self.anthropic_client.messages.stream(
@@ -157,3 +179,9 @@ def get_ai_service() -> AIService:
     if _ai_service is None:
         _ai_service = AIService()
     return _ai_service
+
+
+async def close_ai_service() -> None:
+    """Close the AI service's provider clients if it was created"""
+    if _ai_service is not None:
+        await _ai_service.aclose()
@@ -13,6 +13,17 @@ class ImageService:
         self.api_key = settings.huggingface_api_key
         self.model = "stabilityai/stable-diffusion-xl-base-1.0"
         self.api_url = f"https://router.huggingface.co/hf-inference/models/{self.model}"
+        
+        # Pooled client so repeat requests reuse the TLS connection
+        self._client = httpx.AsyncClient(
+            timeout=120.0,
+            http2=True,
+            limits=httpx.Limits(max_keepalive_connections=10),
+        )
+    
+    async def aclose(self) -> None:
+        """Close the underlying HTTP client"""
+        await self._client.aclose()
     
     async def generate_image(self, prompt: str) -> str:
         """
@@ -40,24 +51,24 @@ class ImageService:
             }
         }
         
-        async with httpx.AsyncClient(timeout=120.0) as client:
-            response = await client.post(
-                self.api_url,
-                headers=headers,
-                json=payload
-            )
-            
+        async with self._client.stream(
+            "POST",
+            self.api_url,
+            headers=headers,
+            json=payload
+        ) as response:
             if response.status_code != 200:
+                await response.aread()
                 error_msg = response.text
                 raise Exception(f"Image generation failed: {error_msg}")
             
-            # Response is raw image bytes
-            image_bytes = response.content
-            
-            # Convert to base64
-            base64_image = base64.b64encode(image_bytes).decode('utf-8')
-            
-            return base64_image
+            # Response is raw image bytes; collect into a single buffer
+            image_bytes = bytearray()
+            async for chunk in response.aiter_bytes(65536):
+                image_bytes += chunk
+        
+        # Convert to base64
+        return base64.b64encode(image_bytes).decode("ascii")
 
 
 # Singleton instance
@@ -70,3 +81,9 @@ def get_image_service() -> ImageService:
     if _image_service is None:
         _image_service = ImageService()
     return _image_service
+
+
+async def close_image_service() -> None:
+    """Close the image service's HTTP client if it was created"""
+    if _image_service is not None:
+        await _image_service.aclose()
@@ -1,69 +1,276 @@
 """
 Voice Service - Speech-to-Text using Groq Whisper API
 """
+import asyncio
+import hashlib
+import io
+import mimetypes
+import os
+import threading
+import time
+import wave
+from collections import OrderedDict
+from typing import BinaryIO
 import httpx
+from openai import AsyncOpenAI, APIError
 from app.config import settings
 
+# Multipart content types for the formats Whisper accepts; the stdlib
+# table misses or disagrees on several of these
+_MIME = {
+    ".webm": "audio/webm",
+    ".mp3": "audio/mpeg",
+    ".wav": "audio/wav",
+    ".m4a": "audio/mp4",
+    ".ogg": "audio/ogg",
+    ".flac": "audio/flac",
+}
+
+# Exact-match transcript cache bounds
+TRANSCRIPT_CACHE_SIZE = 1024
+TRANSCRIPT_CACHE_TTL = 3600.0  # seconds
+
+# Bytes read from the front of a clip when looking for its duration
+HEADER_PEEK_BYTES = 4096
+
+# Upper bound on Groq transcriptions in flight at once; extra callers queue
+MAX_CONCURRENT_TRANSCRIPTIONS = 16
+
+
+class TranscriptionError(Exception):
+    """Groq rejected or failed a transcription after retries"""
+    
+    def __init__(self, message: str, status_code: int | None = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def audio_content_type(filename: str) -> str:
+    """Guess the upload's MIME type from its file extension"""
+    ext = os.path.splitext(filename)[1].lower()
+    return _MIME.get(ext) or mimetypes.guess_type(filename)[0] or "application/octet-stream"
+
+
+def audio_duration_ms(header: bytes) -> float | None:
+    """
+    Read the clip duration from a WAV header.
+    Returns None when it is unknown; WebM and Ogg from live recorders
+    don't carry a duration up front.
+    """
+    if header[:4] != b"RIFF" or header[8:12] != b"WAVE":
+        return None
+    try:
+        with wave.open(io.BytesIO(header)) as wav:
+            nframes, rate = wav.getnframes(), wav.getframerate()
+    except (wave.Error, EOFError):
+        return None
+    # Streaming writers leave the data size as 0 until they finish
+    if not nframes or not rate:
+        return None
+    return nframes * 1000 / rate
+
 
 class VoiceService:
     """Service for speech-to-text using Groq's Whisper API (distil-whisper-large-v3-en)"""
     
+    __slots__ = (
+        "api_key",
+        "model",
+        "_client",
+        "_exact_cache",
+        "_cache_hits",
+        "_cache_misses",
+        "_cache_evictions",
+        "_semaphore",
+        "_inflight",
+    )
+    
     def __init__(self):
         self.api_key = settings.groq_api_key
-        self.api_url = "https://api.groq.com/openai/v1/audio/transcriptions"
+        if not self.api_key:
+            raise RuntimeError("Groq API key not configured. Add GROQ_API_KEY to your .env file.")
         self.model = "whisper-large-v3"  # Current Groq Whisper model
+        
+        # sha256(audio) -> (expires_at, transcript), oldest first
+        self._exact_cache: OrderedDict[bytes, tuple[float, str]] = OrderedDict()
+        self._cache_hits = 0
+        self._cache_misses = 0
+        self._cache_evictions = 0
+        
+        # Back-pressure on the upstream API, and one shared request per
+        # distinct clip that is still in flight
+        self._semaphore = asyncio.Semaphore(MAX_CONCURRENT_TRANSCRIPTIONS)
+        self._inflight: dict[bytes, asyncio.Task[str]] = {}
+        
+        # Groq exposes Whisper through its OpenAI-compatible API. The SDK
+        # sits on a pooled HTTP/2 client so repeat transcriptions reuse
+        # the TLS connection
+        self._client = AsyncOpenAI(
+            api_key=self.api_key,
+            base_url="https://api.groq.com/openai/v1",  # Groq's API endpoint
+            timeout=httpx.Timeout(60.0, connect=5.0),
+            # The SDK retries 429/5xx with jittered exponential backoff
+            # and honours Retry-After; the transport retries failed connects
+            max_retries=3,
+            http_client=httpx.AsyncClient(
+                transport=httpx.AsyncHTTPTransport(
+                    retries=2,
+                    http2=True,
+                    limits=httpx.Limits(
+                        max_keepalive_connections=20,
+                        max_connections=100,
+                        keepalive_expiry=30.0,
+                    ),
+                ),
+            ),
+        )
     
-    async def transcribe_audio(self, audio_bytes: bytes, filename: str = "audio.webm") -> str:
+    async def aclose(self) -> None:
+        """Close the underlying HTTP client"""
+        await self._client.close()
+    
+    async def transcribe_audio(
+        self,
+        audio: bytes | BinaryIO,
+        filename: str = "audio.webm",
+        digest: bytes | None = None,
+    ) -> str:
         """
         Transcribe audio to text using Groq Whisper API.
         
         Args:
-            audio_bytes: Raw audio bytes (supports webm, mp3, wav, m4a, etc.)
+            audio: Raw audio bytes or a seekable binary file (supports webm, mp3, wav, m4a, etc.).
+                Files are streamed into the request body in chunks rather than read whole.
             filename: Original filename with extension (used for format detection)
+            digest: sha256 digest of the audio, if the caller already computed it
             
         Returns:
             Transcribed text string
         """
-        if not self.api_key:
-            raise ValueError("Groq API key not configured. Add GROQ_API_KEY to your .env file.")
+        # Accidental mic taps produce near-empty clips; skip the round trip
+        if self._is_trivial(audio):
+            return ""
         
-        headers = {
-            "Authorization": f"Bearer {self.api_key}",
-        }
+        # Repeated short commands often arrive as byte-identical audio
+        key = digest or self._digest(audio)
+        cached = self._cache_get(key)
+        if cached is not None:
+            return cached
         
-        # Prepare multipart form data
-        files = {
-            "file": (filename, audio_bytes, "audio/webm"),
-        }
-        data = {
-            "model": self.model,
-            "response_format": "text",
-            "language": "en",  # Optimize for English
-        }
+        # Identical clips uploaded at the same time share one request. The
+        # shield keeps a caller that disconnects from cancelling it for the rest
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(self._request(key, audio, filename))
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._request_done(key, t))
+        return await asyncio.shield(task)
+    
+    async def _request(self, key: bytes, audio: bytes | BinaryIO, filename: str) -> str:
+        """Send one transcription request and cache its result"""
+        async with self._semaphore:
+            try:
+                transcript = await self._client.audio.transcriptions.create(
+                    file=(filename, audio, audio_content_type(filename)),
+                    model=self.model,
+                    response_format="text",
+                    language="en",  # Optimize for English
+                )
+            except APIError as e:
+                raise TranscriptionError(
+                    f"Transcription failed: {e.message}",
+                    status_code=getattr(e, "status_code", None),
+                ) from e
         
-        async with httpx.AsyncClient(timeout=60.0) as client:
-            response = await client.post(
-                self.api_url,
-                headers=headers,
-                files=files,
-                data=data
-            )
-            
-            if response.status_code != 200:
-                error_msg = response.text
-                raise Exception(f"Transcription failed: {error_msg}")
-            
-            # Response is plain text
-            return response.text.strip()
+        # Text format comes back as a plain string
+        text = transcript.strip() if isinstance(transcript, str) else transcript.text.strip()
+        self._cache_put(key, text)
+        return text
+    
+    def _request_done(self, key: bytes, task: asyncio.Task) -> None:
+        """Drop a finished request from the in-flight table"""
+        self._inflight.pop(key, None)
+        # Mark the error as retrieved in case every waiter has gone away
+        if not task.cancelled():
+            task.exception()
+    
+    @staticmethod
+    def _is_trivial(audio: bytes | BinaryIO) -> bool:
+        """Whether the clip is too small or too short to hold any speech"""
+        if isinstance(audio, (bytes, bytearray, memoryview)):
+            size = len(audio)
+            header = bytes(audio[:HEADER_PEEK_BYTES])
+        else:
+            size = audio.seek(0, os.SEEK_END)
+            audio.seek(0)
+            header = audio.read(HEADER_PEEK_BYTES)
+            audio.seek(0)
+        
+        if size < settings.voice_min_audio_bytes:
+            return True
+        
+        duration = audio_duration_ms(header)
+        return duration is not None and duration < settings.voice_min_duration_ms
+    
+    @staticmethod
+    def _digest(audio: bytes | BinaryIO) -> bytes:
+        """sha256 of the audio, rewinding file inputs afterwards"""
+        if isinstance(audio, (bytes, bytearray, memoryview)):
+            return hashlib.sha256(audio).digest()
+        digest = hashlib.file_digest(audio, "sha256").digest()
+        audio.seek(0)
+        return digest
+    
+    def _cache_get(self, key: bytes) -> str | None:
+        """Return a live cached transcript and mark it most recently used"""
+        entry = self._exact_cache.get(key)
+        if entry is None or entry[0] <= time.monotonic():
+            if entry is not None:
+                del self._exact_cache[key]
+                self._cache_evictions += 1
+            self._cache_misses += 1
+            return None
+        
+        self._exact_cache.move_to_end(key)
+        self._cache_hits += 1
+        return entry[1]
+    
+    def _cache_put(self, key: bytes, text: str) -> None:
+        """Store a transcript, evicting the least recently used entries past the cap"""
+        self._exact_cache[key] = (time.monotonic() + TRANSCRIPT_CACHE_TTL, text)
+        self._exact_cache.move_to_end(key)
+        while len(self._exact_cache) > TRANSCRIPT_CACHE_SIZE:
+            self._exact_cache.popitem(last=False)
+            self._cache_evictions += 1
+    
+    def cache_stats(self) -> dict:
+        """Transcript cache counters for monitoring"""
+        return {
+            "size": len(self._exact_cache),
+            "hits": self._cache_hits,
+            "misses": self._cache_misses,
+            "evictions": self._cache_evictions,
+        }
 
 
 # Singleton instance
 _voice_service: VoiceService | None = None
+_voice_service_lock = threading.Lock()
 
 
 def get_voice_service() -> VoiceService:
     """Get or create voice service singleton"""
     global _voice_service
+    # Lock-free once built; the lock only guards first construction
+    # against threads racing to build (and leak) a second client
     if _voice_service is None:
-        _voice_service = VoiceService()
+        with _voice_service_lock:
+            if _voice_service is None:
+                _voice_service = VoiceService()
     return _voice_service
+
+
+async def close_voice_service() -> None:
+    """Close the voice service's HTTP client if it was created"""
+    if _voice_service is not None:
+        await _voice_service.aclose()
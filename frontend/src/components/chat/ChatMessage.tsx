@@ -13,6 +13,7 @@ import { motion } from 'framer-motion';
 import { Sparkles, User, Copy, RefreshCw, ThumbsUp, ThumbsDown, Volume2, VolumeX } from 'lucide-react';
 import { Message } from '@/types/chat';
 import { useVoice } from '@/hooks/useVoice';
+import { API_BASE_URL } from '@/lib/api/client';
 
 interface ChatMessageProps {
     message: Message;
@@ -23,6 +24,11 @@ export function ChatMessage({ message, isStreaming = false }: ChatMessageProps)
     const isUser = message.role === 'user';
     const { speak, stopSpeaking, isSpeaking } = useVoice();
 
+    // Saved images come back as server paths; fresh ones are still base64
+    const imageSrc = message.imageUrl
+        ? `${API_BASE_URL}${message.imageUrl}`
+        : `data:image/png;base64,${message.image}`;
+
     const handleSpeak = () => {
         if (isSpeaking) {
             stopSpeaking();
@@ -91,20 +97,20 @@ export function ChatMessage({ message, isStreaming = false }: ChatMessageProps)
                 </div>
 
                 {/* Generated Image */}
-                {message.image && (
+                {(message.image || message.imageUrl) && (
                     <motion.div
                         initial={{ opacity: 0, scale: 0.9 }}
                         animate={{ opacity: 1, scale: 1 }}
                         className="mt-3"
                     >
                         <img
-                            src={`data:image/png;base64,${message.image}`}
+                            src={imageSrc}
                             alt={message.content || "Generated image"}
                             className="rounded-xl max-w-full border border-white/10 hover:scale-[1.02] transition-transform cursor-pointer"
                             onClick={() => {
                                 const win = window.open();
                                 if (win) {
-                                    win.document.write(`<img src="data:image/png;base64,${message.image}" />`);
+                                    win.document.write(`<img src="${imageSrc}" />`);
                                 }
                             }}
                         />
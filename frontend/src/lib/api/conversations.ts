@@ -16,6 +16,7 @@ export interface ConversationWithMessages extends Conversation {
         role: 'user' | 'assistant';
         content: string;
         image?: string;
+        image_url?: string;
         created_at: string;
     }>;
 }
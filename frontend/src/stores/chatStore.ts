@@ -114,6 +114,7 @@ export const useChatStore = create<ChatState>((set, get) => ({
                 role: m.role as 'user' | 'assistant',
                 content: m.content,
                 image: m.image,
+                imageUrl: m.image_url,
             }));
             set({
                 currentConversationId: id,
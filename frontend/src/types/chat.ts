@@ -9,6 +9,7 @@ export interface Message {
     role: MessageRole;
     content: string;
     image?: string;  // base64 encoded image
+    imageUrl?: string;  // server path of an image saved on disk
     createdAt?: Date;
 }
 